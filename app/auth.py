@@ -1,24 +1,113 @@
+import hashlib
+import json
 import os
 import sys
+from datetime import datetime, timedelta
 from threading import Lock
 from google.auth import default
+from google.auth.exceptions import GoogleAuthError
 from google.auth.transport.requests import Request
-from google.auth import impersonated_credentials
+from google.auth import compute_engine, impersonated_credentials
+from google.auth.compute_engine import _metadata
+
+
+def credentials_identity(credentials):
+    """
+    Identify the source of ADC credentials: the GOOGLE_APPLICATION_CREDENTIALS key file and the account behind it.
+
+    Service account credentials carry their email, user credentials from
+    `gcloud auth application-default login` only a refresh token unique to the login.
+    Metadata server credentials (GCE, GKE Workload Identity) only know their email as
+    'default', the actual service account is looked up on the metadata server.
+
+    Returns:
+        Identity to key cached tokens by, or None if the account cannot be told apart from others
+    """
+    email = getattr(credentials, 'service_account_email', None)
+    if isinstance(credentials, compute_engine.Credentials):
+        try:
+            email = _metadata.get_service_account_info(Request(), service_account=email)['email']
+        except (GoogleAuthError, KeyError) as e:
+            print(f"Could not look up the service account on the metadata server: {e}", file=sys.stderr)
+            return None
+        if email.endswith('.svc.id.goog'):
+            # Kubernetes service accounts without a bound Google service account all share the workload pool
+            return None
+
+    identity = email or getattr(credentials, 'refresh_token', None)
+    if not identity:
+        return None
+    return os.getenv('GOOGLE_APPLICATION_CREDENTIALS'), identity
+
+
+def token_cache_path(scopes, target_service_account, source_identity):
+    """
+    Get the cache file for tokens of the given scopes, impersonated service account and source credentials.
+
+    Tokens are cached in $XDG_CACHE_HOME/web-requests-simple (default: ~/.cache/web-requests-simple),
+    in files named after a hash of the key, so the refresh token never ends up on disk.
+    """
+    cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    key_parts = [sorted(scopes or []), target_service_account, source_identity]
+    key = hashlib.sha256(json.dumps(key_parts).encode('utf-8')).hexdigest()
+    return os.path.join(cache_home, 'web-requests-simple', f"{key}.json")
+
+
+def read_cached_token(path, min_validity):
+    """
+    Read a cached token that is still valid for at least min_validity.
+
+    Returns:
+        Tuple of (token, expiry as naive UTC datetime), or None if there is no usable cached token
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+        token = cached['token']
+        expiry = datetime.fromisoformat(cached['expiry'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if expiry - datetime.utcnow() < min_validity:
+        return None
+    return token, expiry
+
+
+def write_cached_token(path, token, expiry):
+    """Atomically write a token to the cache, readable by the current user only."""
+    if expiry is None:
+        return
+
+    try:
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({'token': token, 'expiry': expiry.isoformat()}, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        # Caching is an optimization only, never fail authentication because of it
+        print(f"Could not write token cache: {e}", file=sys.stderr)
 
 
 class TokenManager:
     """Thread-safe token manager that handles token refresh."""
 
-    def __init__(self, scopes, lifetime=3600):
+    def __init__(self, scopes, lifetime=3600, refresh_threshold=300, cache_tokens=False):
         """
         Initialize the token manager.
 
         Args:
             scopes: List of OAuth2 scopes required for authentication
             lifetime: Token lifetime in seconds (default: 3600 = 1 hour)
+            refresh_threshold: Refresh the token when it expires within this many seconds (default: 300)
+            cache_tokens: Persist tokens on disk and reuse them across process restarts (default: False)
         """
         self.scopes = scopes
         self.lifetime = lifetime
+        self.refresh_threshold = timedelta(seconds=refresh_threshold)
+        self.cache_tokens = cache_tokens
+        self.cache_path = None
         self.credentials = None
         self.lock = Lock()
         self._initialize_credentials()
@@ -47,26 +136,61 @@ class TokenManager:
             else:
                 # Use default credentials without impersonation
                 self.credentials, project_id = default(scopes=self.scopes)
+                source_credentials = self.credentials
+
+            if self.cache_tokens:
+                source_identity = credentials_identity(source_credentials)
+                if source_identity:
+                    self.cache_path = token_cache_path(self.scopes, target_service_account, source_identity)
+                else:
+                    print("Not caching tokens, the account of the credentials is unknown", file=sys.stderr)
 
-            self.credentials.refresh(Request())
+            # Reuse a cached token if it is valid beyond the refresh threshold, saving the token round trip
+            cached = read_cached_token(self.cache_path, self.refresh_threshold) if self.cache_path else None
+            if cached:
+                print("Using cached access token", file=sys.stderr)
+                self.credentials.token, self.credentials.expiry = cached
+            else:
+                self._refresh()
         except Exception as e:
             print(f"Error during authentication: {e}", file=sys.stderr)
             print("Failed to get access token. Exiting.", file=sys.stderr)
             sys.exit(1)
 
+    def _refresh(self):
+        """Refresh the credentials and update the token cache."""
+        self.credentials.refresh(Request())
+        if self.cache_path:
+            write_cached_token(self.cache_path, self.credentials.token, self.credentials.expiry)
+
+    def needs_refresh(self):
+        """Check if the token is invalid or expires within the refresh threshold."""
+        if not self.credentials.valid:
+            return True
+        # google-auth stores expiry as a naive UTC datetime
+        expiry = self.credentials.expiry
+        return expiry is not None and expiry - datetime.utcnow() < self.refresh_threshold
+
     def get_token(self):
         """
         Get a valid access token, refreshing if necessary.
 
+        The token is refreshed pre-emptively when it expires within the refresh
+        threshold, so in-flight requests don't race against its expiry.
+
         Returns:
             Access token string
         """
+        # Valid tokens are handed out without the lock, so callers never wait for a refresh they don't need
+        if not self.needs_refresh():
+            return self.credentials.token
+
         with self.lock:
-            # Check if token needs refresh
-            if not self.credentials.valid:
-                print("Token expired, refreshing...", file=sys.stderr)
+            # Check if token needs refresh (another thread may have refreshed it meanwhile)
+            if self.needs_refresh():
+                print("Token expiring, refreshing...", file=sys.stderr)
                 try:
-                    self.credentials.refresh(Request())
+                    self._refresh()
                     print("Token refreshed successfully", file=sys.stderr)
                 except Exception as e:
                     print(f"Error refreshing token: {e}", file=sys.stderr)
@@ -75,17 +199,26 @@ class TokenManager:
 
             return self.credentials.token
 
-    def force_refresh(self):
+    def force_refresh(self, rejected_token=None):
         """
         Force refresh the token (useful when a 401 error is received).
 
+        When several workers get a 401 for the same token, only the first one
+        refreshes it; the others receive the already refreshed token.
+
+        Args:
+            rejected_token: Token that was rejected with a 401 (default: always refresh)
+
         Returns:
             New access token string
         """
         with self.lock:
+            if rejected_token is not None and self.credentials.token != rejected_token and self.credentials.valid:
+                return self.credentials.token
+
             print("Forcing token refresh...", file=sys.stderr)
             try:
-                self.credentials.refresh(Request())
+                self._refresh()
                 print("Token refreshed successfully", file=sys.stderr)
                 return self.credentials.token
             except Exception as e:
@@ -0,0 +1,127 @@
+import re
+import uuid
+from email.parser import BytesParser
+from urllib.parse import urlsplit
+
+
+VERSION_SEGMENT = re.compile(r'^v\d+\w*$')
+
+
+def batch_endpoint(url):
+    """
+    Determine the Google batch endpoint for a request URL.
+
+    Google APIs accept batches at /batch/<api>/<version> on the API host,
+    e.g. https://www.googleapis.com/drive/v3/files is batched to
+    https://www.googleapis.com/batch/drive/v3.
+
+    Args:
+        url: Request URL
+
+    Returns:
+        Batch endpoint URL, or None if the URL is not a batchable Google API URL
+    """
+    parts = urlsplit(url)
+    if parts.scheme != 'https' or not (parts.hostname or '').endswith('.googleapis.com'):
+        return None
+
+    segments = [segment for segment in parts.path.split('/') if segment]
+    if len(segments) < 2 or not VERSION_SEGMENT.match(segments[1]):
+        return None
+
+    return f"https://{parts.netloc}/batch/{segments[0]}/{segments[1]}"
+
+
+def group_batches(items, batch_size):
+    """
+    Partition records into Google batches and records to be sent individually.
+
+    Args:
+        items: List of (idx, record) tuples
+        batch_size: Maximum number of requests per batch
+
+    Returns:
+        Tuple of (list of (batch_url, [(idx, record), ...]) ordered by the first idx, list of (idx, record))
+    """
+    groups = {}
+    single = []
+    for idx, record in items:
+        endpoint = batch_endpoint(record['url']) if record.get('url') else None
+        if endpoint:
+            groups.setdefault(endpoint, []).append((idx, record))
+        else:
+            single.append((idx, record))
+
+    batches = []
+    for endpoint, grouped in groups.items():
+        for start in range(0, len(grouped), batch_size):
+            batches.append((endpoint, grouped[start:start + batch_size]))
+    batches.sort(key=lambda batch: batch[1][0][0])
+    return batches, single
+
+
+def build_batch_body(items, encode_body):
+    """
+    Build a multipart/mixed batch request body.
+
+    Args:
+        items: List of (idx, record) tuples, idx is used as the part Content-ID
+        encode_body: Function of (method, body) returning the JSON body bytes, or None if the method carries no body
+
+    Returns:
+        Tuple of (Content-Type header value, body bytes)
+    """
+    boundary = f"batch_{uuid.uuid4().hex}"
+    lines = []
+    for idx, record in items:
+        method = record.get('method', 'GET').upper()
+        parts = urlsplit(record['url'])
+        path = parts.path + (f"?{parts.query}" if parts.query else '')
+
+        lines.append(f"--{boundary}")
+        lines.append("Content-Type: application/http")
+        lines.append(f"Content-ID: <item{idx}>")
+        lines.append("")
+        lines.append(f"{method} {path} HTTP/1.1")
+        payload = encode_body(method, record.get('body'))
+        if payload is not None:
+            lines.append("Content-Type: application/json; charset=UTF-8")
+            lines.append(f"Content-Length: {len(payload)}")
+            lines.append("")
+            lines.append(payload.decode('utf-8'))
+        else:
+            lines.append("")
+    lines.append(f"--{boundary}--")
+    lines.append("")
+
+    return f"multipart/mixed; boundary={boundary}", "\r\n".join(lines).encode('utf-8')
+
+
+def parse_batch_response(content_type, content):
+    """
+    Split a multipart/mixed batch response into the individual responses.
+
+    Args:
+        content_type: Content-Type header of the batch response
+        content: Body bytes of the batch response
+
+    Returns:
+        Dictionary mapping request idx to (status code, Content-Type, charset, body bytes),
+        charset is None if the part does not declare one
+    """
+    message = BytesParser().parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode('utf-8') + content)
+
+    responses = {}
+    for part in message.get_payload():
+        match = re.search(r'(\d+)>?$', part.get('Content-ID', ''))
+        if not match:
+            continue
+
+        # Each part is a complete HTTP response: status line, headers, blank line, body.
+        # Work on the raw bytes, the parser only keeps non-ASCII bytes intact in this form
+        status_line, _, rest = part.get_payload(decode=True).lstrip().partition(b'\n')
+        status_code = int(status_line.split()[1])
+        inner = BytesParser().parsebytes(rest)
+        responses[int(match.group(1))] = (status_code, inner.get('Content-Type', ''), inner.get_content_charset(),
+                                          inner.get_payload(decode=True).strip())
+    return responses
@@ -1,90 +1,350 @@
 import sys
 import os
+import base64
+import codecs
+import asyncio
 import json
+import logging
+import logging.handlers
+import mmap
+import httpx
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
 import time
-from datetime import datetime
+import random
+import socket
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Semaphore, Lock, Thread, Event
+from functools import partial
+from heapq import merge
+from queue import Queue, SimpleQueue
+from threading import Semaphore, Lock, Thread, Condition, local
 from steputil import StepArgs, StepArgsBuilder
 
 # Add current directory to path for imports
 sys.path.insert(0, os.path.dirname(__file__))
 
-# Import auth module from same directory
+# Import auth and batch modules from same directory
 from auth import TokenManager
+from batch import group_batches, build_batch_body, parse_batch_response
+
+# Logger for worker threads, records are handed to a background thread instead of writing to stderr directly
+logger = logging.getLogger('web-requests')
+logger.setLevel(logging.INFO)
+logger.propagate = False
+
+# HTTP methods that send the record body as JSON
+METHODS_WITH_BODY = frozenset(('POST', 'PUT', 'PATCH'))
+
+# Probe idle connections, so NAT gateways and load balancers don't silently drop them between requests
+KEEPALIVE_SOCKET_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] + [
+    (socket.IPPROTO_TCP, getattr(socket, name), value)
+    for name, value in (('TCP_KEEPIDLE', 60), ('TCP_KEEPINTVL', 30), ('TCP_KEEPCNT', 3))
+    # The idle, interval and count options are not available on every platform
+    if hasattr(socket, name)
+]
+
+# Status codes whose responses never carry a body
+NO_BODY_STATUS_CODES = frozenset((204, 205, 304))
+
+# Status codes considered transient, retried with exponential backoff
+RETRY_STATUS_CODES = frozenset((429, 500, 502, 503, 504))
+
+# Status codes signalling that the server is overloaded, halving the adaptive concurrency
+OVERLOAD_STATUS_CODES = frozenset((429, 503))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
+
+# Integers too large for orjson to parse exactly have 19 or more digits, found in documents
+# translated with DIGIT_MASK (digits to 0, anything else to a space) by a plain substring search
+DIGIT_MASK = bytes(ord('0') if chr(i).isdigit() and i < 128 else ord(' ') for i in range(256))
+LONG_NUMBER = b'0' * 19
+
+# Seconds pre-resolved host addresses are answered from the DNS cache
+DNS_CACHE_TTL = 300
 
 
 class ProgressTracker:
-    """Thread-safe progress tracker for monitoring request processing."""
+    """
+    Thread-safe progress tracker for monitoring request processing.
+
+    Each thread counts into its own [completed, errors] cell, so recording a
+    completed request never writes to state shared with other workers.
+    Statistics are the sum over all cells.
+    """
 
     def __init__(self, total_requests):
         self.total_requests = total_requests
-        self.completed = 0
-        self.errors = 0
         self.start_time = time.time()
-        self.lock = Lock()
+        self._local = local()
+        self._cells = []
+        self._cells_lock = Lock()
+
+    def _cell(self):
+        """Get the counter cell of the calling thread, registering it on first use."""
+        try:
+            return self._local.cell
+        except AttributeError:
+            cell = self._local.cell = [0, 0]
+            with self._cells_lock:
+                self._cells.append(cell)
+            return cell
+
+    @property
+    def completed(self):
+        return sum(cell[0] for cell in self._cells)
+
+    @property
+    def errors(self):
+        return sum(cell[1] for cell in self._cells)
 
     def increment(self, is_error=False):
         """Increment completed count and optionally error count."""
-        with self.lock:
-            self.completed += 1
-            if is_error:
-                self.errors += 1
+        # Only the owning thread writes to its cell
+        cell = self._cell()
+        if is_error:
+            cell[1] += 1
+        cell[0] += 1
 
     def get_stats(self):
         """Get current statistics."""
-        with self.lock:
-            elapsed = time.time() - self.start_time
-            requests_per_minute = (self.completed / elapsed * 60) if elapsed > 0 else 0
-            return {
-                'completed': self.completed,
-                'errors': self.errors,
-                'total': self.total_requests,
-                'elapsed': elapsed,
-                'requests_per_minute': requests_per_minute
-            }
+        # Errors are counted before completions, read them in the same order so errors never exceed completed
+        errors = self.errors
+        completed = self.completed
+        elapsed = time.time() - self.start_time
+        requests_per_minute = (completed / elapsed * 60) if elapsed > 0 else 0
+        return {
+            'completed': completed,
+            'errors': errors,
+            'total': self.total_requests,
+            'elapsed': elapsed,
+            'requests_per_minute': requests_per_minute
+        }
 
 
 class RateLimiter:
-    """Rate limiter that controls the maximum number of requests per minute."""
+    """
+    Token-bucket rate limiter that controls the maximum number of requests per minute.
 
-    def __init__(self, max_requests_per_minute):
+    Implemented as a generic cell rate algorithm: the whole bucket is a single
+    theoretical arrival time in monotonic nanoseconds, so reserving a slot is one
+    max() and one add under the lock. Callers sleep outside of it, so workers only
+    wait when the bucket is empty and never block each other.
+    """
+
+    def __init__(self, max_requests_per_minute, burst=1):
         self.max_requests = max_requests_per_minute
-        if max_requests_per_minute > 0:
-            self.min_interval = 60.0 / max_requests_per_minute
-        else:
-            self.min_interval = 0
-        self.last_request_time = 0
+        self.rate = max_requests_per_minute / 60.0
+        self.capacity = max(1, burst)
+        if self.max_requests > 0:
+            self.interval_ns = int(1e9 / self.rate)
+            # How far ahead of the steady rate a burst may run
+            self.tolerance_ns = (self.capacity - 1) * self.interval_ns
+        # Start with a full bucket
+        self.tat = time.monotonic_ns()
         self.lock = Lock()
 
+    def _reserve(self):
+        """Take a token from the bucket and return the seconds to wait until it is available."""
+        now = time.monotonic_ns()
+        with self.lock:
+            # An idle bucket never accrues more than its capacity
+            tat = max(self.tat, now)
+            self.tat = tat + self.interval_ns
+        wait_ns = tat - self.tolerance_ns - now
+        return wait_ns / 1e9 if wait_ns > 0 else 0
+
     def acquire(self):
         """Wait if necessary to respect the rate limit."""
         if self.max_requests <= 0:
             return  # No rate limiting
 
-        with self.lock:
-            current_time = time.time()
-            time_since_last = current_time - self.last_request_time
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+
+class AsyncRateLimiter(RateLimiter):
+    """Token-bucket rate limiter for the asyncio path that waits with asyncio.sleep instead of blocking the event loop."""
+
+    async def acquire(self):
+        """Wait if necessary to respect the rate limit."""
+        if self.max_requests <= 0:
+            return  # No rate limiting
+
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class ConcurrencyLimiter:
+    """
+    Adaptive (AIMD) limit on the number of requests in flight.
+
+    Starts with a single request in flight and doubles the limit with every window
+    of responses (as many as the current limit) without overload (slow start). The
+    first 429 or 503 response halves the limit and ends slow start; from then on the
+    limit grows by one per window and is halved on every overload response,
+    converging on what the server can handle.
+    """
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.limit = 1
+        self.in_flight = 0
+        self.successes = 0
+        self.slow_start = True
+        self.condition = Condition()
+
+    def _adjust(self, status_code):
+        """Adjust the limit based on the status code of a response (None on connection errors)."""
+        if status_code in OVERLOAD_STATUS_CODES:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+            self.slow_start = False
+        elif status_code is not None:
+            self.successes += 1
+            if self.successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit = min(self.max_concurrency, self.limit * 2 if self.slow_start else self.limit + 1)
+                self.successes = 0
+
+    def acquire(self):
+        """Wait until the number of requests in flight is below the current limit."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    def observe(self, status_code):
+        """Feed the status code of a response that is retried while holding the slot back into the limit."""
+        with self.condition:
+            self._adjust(status_code)
+            self.condition.notify_all()
 
-            if time_since_last < self.min_interval:
-                sleep_time = self.min_interval - time_since_last
-                time.sleep(sleep_time)
+    def release(self, status_code):
+        """Release a slot and feed the status code of the finished request back into the limit."""
+        with self.condition:
+            self.in_flight -= 1
+            self._adjust(status_code)
+            self.condition.notify_all()
 
-            self.last_request_time = time.time()
 
+class AsyncConcurrencyLimiter(ConcurrencyLimiter):
+    """Adaptive (AIMD) concurrency limiter for the asyncio path."""
 
-def progress_reporter(tracker, stop_event, interval=10):
-    """Background thread that prints progress every interval seconds."""
-    while not stop_event.is_set():
-        if stop_event.wait(interval):
-            break
-        stats = tracker.get_stats()
-        print(f"Progress: {stats['completed']}/{stats['total']} requests "
-              f"({stats['errors']} errors) | "
-              f"Elapsed: {stats['elapsed']:.1f}s | "
-              f"Rate: {stats['requests_per_minute']:.1f} req/min",
-              file=sys.stderr)
+    def __init__(self, max_concurrency):
+        super().__init__(max_concurrency)
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        """Wait until the number of requests in flight is below the current limit."""
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+
+    async def observe(self, status_code):
+        """Feed the status code of a response that is retried while holding the slot back into the limit."""
+        async with self.condition:
+            self._adjust(status_code)
+            self.condition.notify_all()
+
+    async def release(self, status_code):
+        """Release a slot and feed the status code of the finished request back into the limit."""
+        async with self.condition:
+            self.in_flight -= 1
+            self._adjust(status_code)
+            self.condition.notify_all()
+
+
+def result_status(result):
+    """Get the HTTP status code of a processed request, None if there was no response."""
+    return result['meta'].get('status') if result else None
+
+
+def process_limited(concurrency_limiter, *args):
+    """Process a single request while holding a slot of the adaptive concurrency limiter."""
+    concurrency_limiter.acquire()
+    result = None
+    try:
+        result = process_request(*args, on_retry=concurrency_limiter.observe)
+        return result
+    finally:
+        concurrency_limiter.release(result_status(result))
+
+
+def start_logging():
+    """
+    Start writing logger records to stderr from a background thread.
+
+    Worker threads only enqueue records, so they never contend for the stderr lock
+    or block on its I/O.
+
+    Returns:
+        QueueListener, stop it to flush the remaining records
+    """
+    log_queue = SimpleQueue()
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, handler)
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    listener.start()
+    return listener
+
+
+def report_progress(completions, tracker, interval=10):
+    """
+    Pass completed (index, result) tuples through, printing progress every interval seconds.
+
+    Progress is checked as results arrive, so no reporter thread is needed. While no
+    request completes, the next report is delayed until one does.
+    """
+    next_report = time.monotonic() + interval
+    for completion in completions:
+        if time.monotonic() >= next_report:
+            next_report = time.monotonic() + interval
+            stats = tracker.get_stats()
+            logger.info(f"Progress: {stats['completed']}/{stats['total']} requests "
+                        f"({stats['errors']} errors) | "
+                        f"Elapsed: {stats['elapsed']:.1f}s | "
+                        f"Rate: {stats['requests_per_minute']:.1f} req/min")
+        yield completion
+
+
+def read_records(path):
+    """
+    Read the request records from a JSONL file.
+
+    Same result as InputField.readJsons, but the file is memory mapped and each
+    line is parsed with orjson straight from the bytes, so large inputs don't stall startup.
+    Lines orjson cannot parse exactly are left to the stdlib json module.
+
+    Returns:
+        List of record dictionaries, empty if path is None
+
+    Raises:
+        json.JSONDecodeError: If a line contains invalid JSON
+    """
+    if path is None:
+        return []
+
+    records = []
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return records  # Empty files cannot be mapped
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line_num, line in enumerate(iter(mm.readline, b''), 1):
+                line = line.strip()
+                if not line:
+                    continue  # Skip empty lines
+                try:
+                    records.append(parse_json(line))
+                except json.JSONDecodeError as e:
+                    raise json.JSONDecodeError(f"Invalid JSON on line {line_num}: {e.msg}", e.doc, e.pos)
+    return records
 
 
 def replace_at_type_in_dict(obj):
@@ -102,19 +362,266 @@ def replace_at_type_in_dict(obj):
         return obj
 
 
-def process_request(idx, record, headers, rate_limiter, progress_tracker, timestamp_format, token_manager=None):
-    """Process a single request and return the result."""
-    # Extract request fields
-    method = record.get('method', 'GET').upper()
-    url = record.get('url')
-    body = record.get('body')
+def retry_delay(retry, retry_after=None):
+    """
+    Compute the delay before the next retry using exponential backoff with jitter.
 
-    if not url:
-        progress_tracker.increment(is_error=True)
+    Args:
+        retry: Number of retries already made for the request
+        retry_after: Value of the Retry-After response header, if any
+
+    Returns:
+        Delay in seconds, at most RETRY_MAX_DELAY
+    """
+    delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** retry) * random.uniform(0.5, 1.0)
+
+    # Honor Retry-After, given either as seconds or as an HTTP date
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(retry_after)
+                delay = max(delay, (retry_at - datetime.now(timezone.utc)).total_seconds())
+            except (TypeError, ValueError):
+                pass
+
+    return min(delay, RETRY_MAX_DELAY)
+
+
+class DnsCache:
+    """
+    In-process cache in front of socket.getaddrinfo.
+
+    Both urllib3 and the asyncio loop resolve through socket.getaddrinfo for every new
+    connection, urllib3 with the host name as str and httpx (through anyio) as IDNA encoded
+    bytes, so hosts are looked up by their ASCII form. Once installed, hosts resolved by resolve_hosts are answered from memory
+    until their entry is DNS_CACHE_TTL seconds old, any other lookup goes to the system resolver.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self._getaddrinfo = socket.getaddrinfo
+
+    @staticmethod
+    def _host_key(host):
+        """Get the ASCII form of a host name, as str."""
+        if isinstance(host, bytes):
+            return host.decode('ascii', 'replace')
+        try:
+            return host.encode('idna').decode('ascii')
+        except UnicodeError:
+            return host
+
+    def resolve(self, host):
+        """Resolve a host with the system resolver and cache its stream socket addresses."""
+        addresses = self._getaddrinfo(host, None, type=socket.SOCK_STREAM)
+        self.entries[self._host_key(host)] = (time.monotonic(), addresses)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        entry = self.entries.get(self._host_key(host)) if host else None
+        if (entry is None or time.monotonic() - entry[0] > DNS_CACHE_TTL or not isinstance(port, int)
+                or type not in (0, socket.SOCK_STREAM) or proto or flags):
+            return self._getaddrinfo(host, port, family, type, proto, flags)
+        # Cached addresses were resolved without a port, fill in the one being connected to
+        return [(af, socktype, sockproto, canonname, (sockaddr[0], port) + tuple(sockaddr[2:]))
+                for af, socktype, sockproto, canonname, sockaddr in entry[1]
+                if family in (0, af)]
+
+    def install(self):
+        socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self):
+        socket.getaddrinfo = self._getaddrinfo
+
+
+def resolve_hosts(records, dns_cache, concurrency):
+    """
+    Resolve the host of every distinct request URL once, in parallel, before dispatching requests.
+
+    The addresses are kept in the DNS cache, so DNS lookups are not on the critical
+    path of any request. Failures are ignored, they are reported by the requests themselves.
+
+    Returns:
+        Number of hosts resolved successfully
+    """
+    hosts = set()
+    for record in records:
+        try:
+            parts = urlsplit(record.get('url') or '')
+            if parts.hostname:
+                hosts.add(parts.hostname)
+        except ValueError:
+            continue
+
+    resolved = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(hosts)))) as executor:
+        for future in as_completed([executor.submit(dns_cache.resolve, host) for host in hosts]):
+            try:
+                future.result()
+                resolved += 1
+            except OSError:
+                pass
+    return resolved
+
+
+class CachedEnvironmentSession(requests.Session):
+    """
+    Session that reads proxy and CA bundle settings from the environment once per origin.
+
+    requests scans every environment variable for proxy settings on each request,
+    which costs more CPU than the rest of the request handling. The environment does
+    not change during a run, so the merged settings are reused for the same origin.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._environment_settings = {}
+
+    def merge_environment_settings(self, url, proxies, stream, verify, cert):
+        if proxies:
+            # Explicit proxies are merged with the environment as usual
+            return super().merge_environment_settings(url, proxies, stream, verify, cert)
+
+        parts = urlsplit(url)
+        key = (parts.scheme, parts.netloc, stream, verify, cert)
+        settings = self._environment_settings.get(key)
+        if settings is None:
+            settings = self._environment_settings[key] = super().merge_environment_settings(url, {}, stream, verify, cert)
+        return {**settings, 'proxies': dict(settings['proxies'])}
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTP adapter that enables TCP keepalive on its pooled connections."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        # Keep urllib3's defaults (TCP_NODELAY) in addition to the keepalive options
+        kwargs['socket_options'] = HTTPConnection.default_socket_options + KEEPALIVE_SOCKET_OPTIONS
+        super().init_poolmanager(*args, **kwargs)
+
+
+def create_session(headers, concurrency, max_retries=0):
+    """
+    Create a session with a keep-alive connection pool sized to the concurrency.
+
+    Failures to establish a connection are retried by urllib3, the request was not
+    sent yet so this is safe for any method. Errors while reading the response (e.g. a
+    pooled connection closed by the server) are retried for idempotent methods only.
+    Retries based on the response status are left to process_request, so they pass
+    through the rate limiter like any other request.
+    """
+    session = CachedEnvironmentSession()
+    # read=False (unlike read=0) re-raises read errors as they are, e.g. ReadTimeout instead of MaxRetryError
+    retry = Retry(total=None, connect=max_retries, read=max_retries or False, status=0, other=0, backoff_factor=0.5,
+                  allowed_methods=Retry.DEFAULT_ALLOWED_METHODS)
+    adapter = KeepAliveAdapter(pool_connections=concurrency, pool_maxsize=concurrency, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(headers)
+    return session
+
+
+def read_body(response, max_bytes, capture=True):
+    """
+    Read the response body, stopping once more than max_bytes have been received.
+
+    Without capture the body is read and discarded, so the connection can be reused.
+
+    Returns:
+        Tuple of (content bytes, truncated flag)
+    """
+    chunks = []
+    size = 0
+    try:
+        if response.status_code in NO_BODY_STATUS_CODES or response.request.method == 'HEAD':
+            return b'', False
+        for chunk in response.iter_content(chunk_size=64 * 1024):
+            size += len(chunk)
+            if capture:
+                chunks.append(chunk)
+            if max_bytes and size > max_bytes:
+                return b''.join(chunks)[:max_bytes], capture
+        return b''.join(chunks), False
+    finally:
+        response.close()
+
+
+async def read_body_async(response, max_bytes, capture=True):
+    """
+    Read a streamed httpx response body, stopping once more than max_bytes have been received.
+
+    Without capture the body is read and discarded, so the connection can be reused.
+
+    Returns:
+        Tuple of (content bytes, truncated flag)
+    """
+    chunks = []
+    size = 0
+    try:
+        if response.status_code in NO_BODY_STATUS_CODES or response.request.method == 'HEAD':
+            return b'', False
+        async for chunk in response.aiter_bytes():
+            size += len(chunk)
+            if capture:
+                chunks.append(chunk)
+            if max_bytes and size > max_bytes:
+                return b''.join(chunks)[:max_bytes], capture
+        return b''.join(chunks), False
+    finally:
+        await response.aclose()
+
+
+def encode_body(method, body):
+    """
+    Serialize the request body to JSON once, so retries don't encode it again.
+
+    Returns:
+        JSON bytes, or None if the method carries no body
+    """
+    if not body or method not in METHODS_WITH_BODY:
         return None
+    try:
+        return orjson.dumps(body)
+    except orjson.JSONEncodeError:
+        # orjson is limited to 64-bit integers, the stdlib encoder is not
+        return json.dumps(body).encode('utf-8')
 
-    # Prepare the result entry
-    result = {
+
+def parse_json(content, encoding=None):
+    """
+    Parse JSON bytes with the same result as the stdlib json module.
+
+    orjson is used where it gives the same result. Documents with integers beyond
+    64 bits (which orjson turns into floats), NaN or Infinity (which orjson rejects)
+    or a declared charset other than UTF-8 are left to the stdlib.
+
+    Raises:
+        ValueError: If the content is not valid JSON
+    """
+    try:
+        utf8 = not encoding or codecs.lookup(encoding).name == 'utf-8'
+    except LookupError:
+        utf8 = True
+    if not utf8:
+        return json.loads(content.decode(encoding))
+    if LONG_NUMBER not in content.translate(DIGIT_MASK):
+        try:
+            return orjson.loads(content)
+        except orjson.JSONDecodeError:
+            pass  # Possibly NaN or Infinity, which the stdlib accepts
+    return json.loads(content)
+
+
+def body_headers(body_bytes, default_headers):
+    """Get the Content-Type header for a pre-serialized body, unless the defaults already set one."""
+    if body_bytes is None or 'Content-Type' in default_headers:
+        return {}
+    return {'Content-Type': 'application/json'}
+
+
+def create_result(method, url, body):
+    """Create the result entry for a request."""
+    return {
         'request': {
             'method': method,
             'url': url,
@@ -123,6 +630,92 @@ def process_request(idx, record, headers, rate_limiter, progress_tracker, timest
         'meta': {}
     }
 
+
+def fill_response(result, status_code, content, truncated, encoding, content_type='', raw_body=False):
+    """
+    Fill the result entry from a received response.
+
+    Returns:
+        True if the response status code indicates success
+    """
+    if truncated:
+        result['meta']['truncated'] = True
+
+    # Try to parse response as JSON, otherwise store as text
+    if not content:
+        # Nothing to decode for empty bodies (e.g. 204 No Content or HEAD)
+        response_body = ''
+    elif raw_body:
+        # Keep the exact bytes, the caller decodes them
+        response_body = base64.b64encode(content).decode('ascii')
+    elif truncated:
+        # Oversized bodies are never parsed, only kept as truncated text
+        response_body = content.decode(encoding or 'utf-8', errors='replace')
+    elif content_type and 'json' not in content_type.lower():
+        # Declared non-JSON (HTML, plain text, ...), skip the parse attempt and its exception
+        response_body = content.decode(encoding or 'utf-8', errors='replace')
+    else:
+        try:
+            # orjson parses straight from the bytes, much faster than the stdlib on large responses.
+            # Parsing stays on the worker thread: handing the parsed document back from a process
+            # pool means unpickling it under the GIL, which costs about as much as parsing it here
+            response_body = parse_json(content, encoding)
+            # Replace @type with type for BigQuery compatibility, the rewrite copies the whole
+            # document so skip it unless the key can occur (possibly with an escaped @)
+            if b'@type' in content or b'\\u0040' in content:
+                response_body = replace_at_type_in_dict(response_body)
+        except ValueError:
+            response_body = content.decode(encoding or 'utf-8', errors='replace')
+
+    # Check if request was successful based on status code
+    result['meta']['status'] = status_code
+    is_success = 200 <= status_code < 300
+
+    if is_success:
+        # If successful, put response body in 'result' field and leave message empty
+        result['result'] = response_body
+        result['meta']['message'] = ''
+    else:
+        # If not successful, omit 'result' field and put response in meta.message
+        result['meta']['message'] = response_body if isinstance(response_body, str) else str(response_body)
+
+    result['success'] = is_success
+    return is_success
+
+
+def fill_error(result, error):
+    """Fill the result entry for a request that failed without a response."""
+    # On error, omit 'result' field and put error in meta.message
+    # result['result'] is not set, so field is missing
+    result['meta']['status'] = None
+    # Some exceptions (e.g. httpx timeouts) carry no message, fall back to the exception type
+    result['meta']['message'] = str(error) or type(error).__name__
+    result['success'] = False
+
+
+def process_request(idx, record, session, rate_limiter, progress_tracker, timestamp_format, token_manager=None,
+                    timeout=None, body_max_bytes=None, max_retries=0, raw_body=False, capture_body=True, on_retry=None):
+    """
+    Process a single request and return the result.
+
+    on_retry is called with the status code of every response that is retried.
+    """
+    # Extract request fields
+    method = record.get('method', 'GET').upper()
+    url = record.get('url')
+    body = record.get('body')
+
+    if not url:
+        progress_tracker.increment(is_error=True)
+        return None
+
+    # Prepare the result entry
+    result = create_result(method, url, body)
+
+    # Only send the body for methods that carry one (assume body is already a dict/object)
+    body_bytes = encode_body(method, body)
+    content_headers = body_headers(body_bytes, session.headers)
+
     # Apply rate limiting before making the request
     rate_limiter.acquire()
 
@@ -130,62 +723,251 @@ def process_request(idx, record, headers, rate_limiter, progress_tracker, timest
     request_timestamp = datetime.utcnow().strftime(timestamp_format)
     start_time = time.time()
 
-    # Make the request with retry logic for token expiration
-    max_retries = 1 if token_manager else 0
-    for attempt in range(max_retries + 1):
+    # Make the request with retry logic for token expiration and transient errors
+    auth_retried = False
+    refresh_token = False
+    retries = 0
+    while True:
         # Refresh headers with current token if using token manager
-        current_headers = headers.copy()
-        if token_manager and attempt > 0:
-            # On retry, force refresh the token
-            new_token = token_manager.force_refresh()
-            current_headers['Authorization'] = f'Bearer {new_token}'
+        current_headers = content_headers
+        if token_manager and refresh_token:
+            # On retry after a 401, force refresh the rejected token (unless another worker already did)
+            refresh_token = False
+            current_token = token_manager.force_refresh(current_token)
+            current_headers = {**content_headers, 'Authorization': f'Bearer {current_token}'}
         elif token_manager:
-            # On first attempt, just get the current token (may refresh if expired)
+            # Otherwise, just get the current token (may refresh if expired)
             current_token = token_manager.get_token()
-            current_headers['Authorization'] = f'Bearer {current_token}'
+            current_headers = {**content_headers, 'Authorization': f'Bearer {current_token}'}
 
         # Issue the request
         try:
-            if method in ['GET', 'DELETE']:
-                response = requests.request(method, url, headers=current_headers)
-            elif method in ['POST', 'PUT', 'PATCH']:
-                if body:
-                    # Assume body is already a dict/object
-                    response = requests.request(method, url, json=body, headers=current_headers)
-                else:
-                    response = requests.request(method, url, headers=current_headers)
-            else:
-                response = requests.request(method, url, headers=current_headers)
+            # The static headers are set on the session, only pass headers when there are request specific ones
+            response = session.request(method, url, data=body_bytes, headers=current_headers or None, timeout=timeout,
+                                       stream=True)
+
+            # Check if we got a 401 and should retry
+            if response.status_code == 401 and token_manager and not auth_retried:
+                response.close()
+                logger.warning(f"Got 401 Unauthorized for request {idx + 1}, retrying with refreshed token...")
+                auth_retried = refresh_token = True
+                continue  # Retry with refreshed token
+
+            # Check if we got a transient error and should back off before retrying
+            if response.status_code in RETRY_STATUS_CODES and retries < max_retries:
+                response.close()
+                if on_retry:
+                    on_retry(response.status_code)
+                delay = retry_delay(retries, response.headers.get('Retry-After'))
+                logger.warning(f"Got {response.status_code} for request {idx + 1}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                rate_limiter.acquire()
+                retries += 1
+                continue
+
+            content, truncated = read_body(response, body_max_bytes, capture_body)
 
             # Calculate duration in milliseconds
             duration_millis = int((time.time() - start_time) * 1000)
 
-            # Check if we got a 401 and should retry
-            if response.status_code == 401 and attempt < max_retries:
-                print(f"Got 401 Unauthorized for request {idx + 1}, retrying with refreshed token...", file=sys.stderr)
+            is_success = fill_response(result, response.status_code, content, truncated, response.encoding,
+                                       response.headers.get('Content-Type', ''), raw_body)
+            progress_tracker.increment(is_error=not is_success)
+            break  # Exit retry loop
+
+        except Exception as e:
+            # Calculate duration even on error
+            duration_millis = int((time.time() - start_time) * 1000)
+
+            fill_error(result, e)
+            progress_tracker.increment(is_error=True)
+            break  # Exit retry loop on exception
+
+    # Add metadata
+    result['timestamp'] = request_timestamp
+    result['meta']['durationMillis'] = duration_millis
+
+    return result
+
+
+def process_batch(batch_url, items, session, rate_limiter, progress_tracker, timestamp_format, token_manager=None,
+                  timeout=None, body_max_bytes=None, max_retries=0, raw_body=False, capture_body=True):
+    """
+    Send several requests as one Google multipart/mixed batch request.
+
+    Returns:
+        List of (index, result) tuples, one per batched request
+    """
+    results = {idx: create_result(record.get('method', 'GET').upper(), record['url'], record.get('body'))
+               for idx, record in items}
+    batch_content_type, batch_body = build_batch_body(items, encode_body)
+
+    # Apply rate limiting once for the whole batch, it is a single HTTP call
+    rate_limiter.acquire()
+
+    # Capture timestamp before making the request
+    request_timestamp = datetime.utcnow().strftime(timestamp_format)
+    start_time = time.time()
+
+    # Make the request with retry logic for token expiration and transient errors
+    auth_retried = False
+    refresh_token = False
+    retries = 0
+    while True:
+        current_headers = {'Content-Type': batch_content_type}
+        if token_manager and refresh_token:
+            refresh_token = False
+            current_token = token_manager.force_refresh(current_token)
+            current_headers['Authorization'] = f'Bearer {current_token}'
+        elif token_manager:
+            current_token = token_manager.get_token()
+            current_headers['Authorization'] = f'Bearer {current_token}'
+
+        try:
+            response = session.post(batch_url, data=batch_body, headers=current_headers, timeout=timeout, stream=True)
+
+            if response.status_code == 401 and token_manager and not auth_retried:
+                response.close()
+                logger.warning(f"Got 401 Unauthorized for batch {batch_url}, retrying with refreshed token...")
+                auth_retried = refresh_token = True
                 continue  # Retry with refreshed token
 
-            # Try to parse response as JSON, otherwise store as text
-            try:
-                response_body = response.json()
-                # Replace @type with type for BigQuery compatibility
-                response_body = replace_at_type_in_dict(response_body)
-            except:
-                response_body = response.text
+            if response.status_code in RETRY_STATUS_CODES and retries < max_retries:
+                delay = retry_delay(retries, response.headers.get('Retry-After'))
+                response.close()
+                logger.warning(f"Got {response.status_code} for batch {batch_url}, retrying in {delay:.1f}s...")
+                time.sleep(delay)
+                rate_limiter.acquire()
+                retries += 1
+                continue
 
-            # Check if request was successful based on status code
-            result['meta']['status'] = response.status_code
-            is_success = 200 <= response.status_code < 300
+            # The parts can only be split from the complete batch response
+            content, truncated = read_body(response, body_max_bytes)
 
-            if is_success:
-                # If successful, put response body in 'result' field and leave message empty
-                result['result'] = response_body
-                result['meta']['message'] = ''
+            if 200 <= response.status_code < 300 and truncated:
+                for result in results.values():
+                    fill_error(result, f'Batch response exceeded bodyMaxBytes ({body_max_bytes} bytes)')
+                    progress_tracker.increment(is_error=True)
+            elif 200 <= response.status_code < 300:
+                responses = parse_batch_response(response.headers.get('Content-Type', ''), content)
+                for idx, result in results.items():
+                    if idx in responses:
+                        status_code, part_content_type, charset, part_content = responses[idx]
+                        if not capture_body:
+                            part_content = b''
+                        is_success = fill_response(result, status_code, part_content, False, charset,
+                                                   part_content_type, raw_body)
+                    else:
+                        fill_error(result, 'Missing response in batch')
+                        is_success = False
+                    progress_tracker.increment(is_error=not is_success)
             else:
-                # If not successful, omit 'result' field and put response in meta.message
-                result['meta']['message'] = response_body if isinstance(response_body, str) else str(response_body)
+                # The batch itself was rejected, report its response for every request in it
+                if not capture_body:
+                    content, truncated = b'', False
+                for result in results.values():
+                    fill_response(result, response.status_code, content, truncated, response.encoding,
+                                  response.headers.get('Content-Type', ''), raw_body)
+                    progress_tracker.increment(is_error=True)
+            break  # Exit retry loop
+
+        except Exception as e:
+            for result in results.values():
+                fill_error(result, e)
+                progress_tracker.increment(is_error=True)
+            break  # Exit retry loop on exception
+
+    # Add metadata, all requests of a batch share its timing
+    duration_millis = int((time.time() - start_time) * 1000)
+    for result in results.values():
+        result['timestamp'] = request_timestamp
+        result['meta']['durationMillis'] = duration_millis
+
+    return list(results.items())
+
+
+async def process_request_async(idx, record, client, rate_limiter, progress_tracker, timestamp_format,
+                                token_manager=None, body_max_bytes=None, max_retries=0, raw_body=False,
+                                capture_body=True, on_retry=None):
+    """
+    Process a single request on the event loop and return the result.
+
+    on_retry is awaited with the status code of every response that is retried.
+    """
+    # Extract request fields
+    method = record.get('method', 'GET').upper()
+    url = record.get('url')
+    body = record.get('body')
+
+    if not url:
+        progress_tracker.increment(is_error=True)
+        return None
+
+    # Prepare the result entry
+    result = create_result(method, url, body)
+
+    # Only send the body for methods that carry one (assume body is already a dict/object)
+    body_bytes = encode_body(method, body)
+    content_headers = body_headers(body_bytes, client.headers)
+
+    # Apply rate limiting before making the request
+    await rate_limiter.acquire()
+
+    # Capture timestamp before making the request
+    request_timestamp = datetime.utcnow().strftime(timestamp_format)
+    start_time = time.time()
+
+    # Make the request with retry logic for token expiration and transient errors
+    auth_retried = False
+    refresh_token = False
+    retries = 0
+    while True:
+        current_headers = content_headers
+        if token_manager and refresh_token:
+            # On retry after a 401, force refresh the rejected token without blocking the event loop
+            refresh_token = False
+            current_token = await asyncio.to_thread(token_manager.force_refresh, current_token)
+            current_headers = {**content_headers, 'Authorization': f'Bearer {current_token}'}
+        elif token_manager and token_manager.needs_refresh():
+            # A pre-emptive refresh is a blocking OAuth round trip, run it off the event loop as well
+            current_token = await asyncio.to_thread(token_manager.get_token)
+            current_headers = {**content_headers, 'Authorization': f'Bearer {current_token}'}
+        elif token_manager:
+            current_token = token_manager.get_token()
+            current_headers = {**content_headers, 'Authorization': f'Bearer {current_token}'}
+
+        # Issue the request
+        try:
+            # The static headers are set on the client, only pass headers when there are request specific ones
+            request = client.build_request(method, url, content=body_bytes, headers=current_headers or None)
+            response = await client.send(request, stream=True)
+
+            # Check if we got a 401 and should retry
+            if response.status_code == 401 and token_manager and not auth_retried:
+                await response.aclose()
+                logger.warning(f"Got 401 Unauthorized for request {idx + 1}, retrying with refreshed token...")
+                auth_retried = refresh_token = True
+                continue  # Retry with refreshed token
+
+            # Check if we got a transient error and should back off before retrying
+            if response.status_code in RETRY_STATUS_CODES and retries < max_retries:
+                await response.aclose()
+                if on_retry:
+                    await on_retry(response.status_code)
+                delay = retry_delay(retries, response.headers.get('Retry-After'))
+                logger.warning(f"Got {response.status_code} for request {idx + 1}, retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+                await rate_limiter.acquire()
+                retries += 1
+                continue
+
+            content, truncated = await read_body_async(response, body_max_bytes, capture_body)
+
+            # Calculate duration in milliseconds
+            duration_millis = int((time.time() - start_time) * 1000)
 
-            result['success'] = is_success
+            is_success = fill_response(result, response.status_code, content, truncated, response.encoding,
+                                       response.headers.get('Content-Type', ''), raw_body)
             progress_tracker.increment(is_error=not is_success)
             break  # Exit retry loop
 
@@ -193,11 +975,7 @@ def process_request(idx, record, headers, rate_limiter, progress_tracker, timest
             # Calculate duration even on error
             duration_millis = int((time.time() - start_time) * 1000)
 
-            # On error, omit 'result' field and put error in meta.message
-            # result['result'] is not set, so field is missing
-            result['meta']['status'] = None
-            result['meta']['message'] = str(e)
-            result['success'] = False
+            fill_error(result, e)
             progress_tracker.increment(is_error=True)
             break  # Exit retry loop on exception
 
@@ -208,6 +986,219 @@ def process_request(idx, record, headers, rate_limiter, progress_tracker, timest
     return result
 
 
+async def process_requests_async(items, headers, concurrency, rate_limiter, progress_tracker, timestamp_format,
+                                 token_manager, timeout, body_max_bytes, max_retries, http2, completed,
+                                 concurrency_limiter=None, raw_body=False, capture_body=True):
+    """
+    Process all requests concurrently on a single event loop.
+
+    A fixed pool of concurrency workers pulls requests from a shared iterator, so memory stays
+    bounded by the concurrency rather than the number of records. Each finished request is put
+    on the completed queue as an (index, result) tuple, followed by None once all requests are done.
+    """
+    # Keep idle connections (and their resolved addresses) around across rate limit gaps, httpx drops them after 5s
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency, keepalive_expiry=60)
+    client_timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+
+    async def run(idx, record):
+        result = None
+        if concurrency_limiter:
+            await concurrency_limiter.acquire()
+        try:
+            result = await process_request_async(idx, record, client, rate_limiter, progress_tracker, timestamp_format,
+                                                 token_manager, body_max_bytes, max_retries, raw_body, capture_body,
+                                                 concurrency_limiter.observe if concurrency_limiter else None)
+        except Exception as e:
+            progress_tracker.increment(is_error=True)
+            logger.error(f"Unexpected error processing request {idx + 1}: {e}")
+        finally:
+            if concurrency_limiter:
+                await concurrency_limiter.release(result_status(result))
+        completed.put((idx, result))
+
+    async def worker(pending):
+        # next() never awaits, so workers on the same loop can share one iterator safely
+        for idx, record in pending:
+            await run(idx, record)
+
+    # With HTTP/2, concurrent requests to the same host are multiplexed as streams over one connection.
+    # Failures to establish a connection are retried by the transport, like urllib3 does on the threaded path.
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2, retries=max_retries,
+                                         socket_options=KEEPALIVE_SOCKET_OPTIONS)
+
+    # Servers without HTTP/2 support silently fall back to HTTP/1.1, report what each host negotiated
+    protocols = {}
+
+    async def log_protocol(response):
+        host = response.request.url.host
+        if host not in protocols:
+            protocols[host] = response.http_version
+            logger.info(f"Using {response.http_version} for {host}")
+
+    event_hooks = {'response': [log_protocol]} if http2 else {}
+
+    try:
+        async with httpx.AsyncClient(headers=headers, transport=transport, timeout=client_timeout,
+                                     follow_redirects=True, event_hooks=event_hooks) as client:
+            pending = iter(items)
+            await asyncio.gather(*(worker(pending) for _ in range(max(1, min(concurrency, len(items))))))
+    finally:
+        completed.put(None)
+
+
+def run_loop(coroutine, errors):
+    """Run a coroutine on a new event loop, keeping any exception (SystemExit included) in errors for the caller."""
+    try:
+        asyncio.run(coroutine)
+    except BaseException as e:
+        errors.append(e)
+
+
+def submit_bounded(executor, jobs, completed, max_pending):
+    """
+    Submit jobs to the executor, with at most max_pending of them submitted but not yet completed.
+
+    Jobs are (key, function, *args) tuples. Each finished future is put on the completed
+    queue as a (key, future) tuple, followed by None once all jobs are done. Only a bounded
+    number of futures and their arguments are alive at any time, however many records there are.
+    """
+    slots = Semaphore(max_pending)
+
+    def done(key, future):
+        completed.put((key, future))
+        slots.release()
+
+    try:
+        for key, fn, *args in jobs:
+            slots.acquire()
+            try:
+                future = executor.submit(fn, *args)
+            except Exception:
+                slots.release()
+                raise
+            future.add_done_callback(partial(done, key))
+    finally:
+        # All slots are free again once every submitted job has completed
+        for _ in range(max_pending):
+            slots.acquire()
+        completed.put(None)
+
+
+def iter_completed(completed, progress_tracker):
+    """
+    Yield (index, result) tuples from (key, future) tuples of completed jobs.
+
+    The key is the index of a single request, or the list of (idx, record) tuples of a batch.
+    """
+    for key, future in completed:
+        if isinstance(key, list):
+            try:
+                yield from future.result()
+            except Exception as e:
+                for idx, _ in key:
+                    progress_tracker.increment(is_error=True)
+                    yield idx, None
+                logger.error(f"Unexpected error processing batch of requests {key[0][0] + 1}-{key[-1][0] + 1}: {e}")
+            continue
+
+        try:
+            yield key, future.result()
+        except Exception as e:
+            progress_tracker.increment(is_error=True)
+            logger.error(f"Unexpected error processing request {key + 1}: {e}")
+            yield key, None
+
+
+def body_key(body):
+    """Serialize a request body with sorted keys, so equal bodies give equal keys."""
+    if not body:
+        return b''
+    try:
+        return orjson.dumps(body, option=orjson.OPT_SORT_KEYS)
+    except orjson.JSONEncodeError:
+        # orjson is limited to 64-bit integers, the stdlib encoder is not
+        return json.dumps(body, sort_keys=True).encode('utf-8')
+
+
+def deduplicate(records):
+    """
+    Group identical requests by method, url and body, so each is only issued once.
+
+    Returns:
+        Tuple of (list of (index, record) to dispatch, dictionary mapping a dispatched
+        index to the indices of its duplicates)
+    """
+    unique = []
+    first_idx = {}
+    duplicates = {}
+    for idx, record in enumerate(records):
+        url = record.get('url')
+        if not url:
+            # Records without url are skipped anyway, no need to group them
+            unique.append((idx, record))
+            continue
+
+        key = (record.get('method', 'GET').upper(), url, body_key(record.get('body')))
+        if key in first_idx:
+            duplicates.setdefault(first_idx[key], []).append(idx)
+        else:
+            first_idx[key] = idx
+            unique.append((idx, record))
+    return unique, duplicates
+
+
+def scatter_duplicates(completions, duplicates, progress_tracker):
+    """Yield each completed (index, result) tuple again for every duplicate of the request."""
+    for idx, result in completions:
+        # Read the flag up front, the result is shared and its success flag is removed once written
+        is_success = bool(result and result.get('success'))
+        yield idx, result
+        for duplicate_idx in duplicates.get(idx, ()):
+            progress_tracker.increment(is_error=not is_success)
+            yield duplicate_idx, result
+
+
+def in_order(completions):
+    """
+    Yield results in input order from (index, result) tuples arriving in completion order.
+
+    Results that complete early are held back only until all preceding ones have
+    been yielded, so memory is bounded by how far completion runs ahead of input order.
+    """
+    pending = {}
+    next_idx = 0
+    for idx, result in completions:
+        if idx != next_idx:
+            # Hold back until all preceding results have arrived
+            pending[idx] = result
+            continue
+
+        # Results arriving in order (always the case with concurrency 1) skip the pending dictionary
+        while True:
+            next_idx += 1
+            if result:
+                # Remove success flag before writing (internal use only)
+                result.pop('success', None)
+                yield result
+            if next_idx not in pending:
+                break
+            result = pending.pop(next_idx)
+
+    if pending:
+        # Processing stopped before all preceding results arrived, never drop the held back ones silently
+        raise RuntimeError(f"No result for request {next_idx + 1}, {len(pending)} later results were not written")
+
+
+def write_results(output, completions):
+    """Stream results to the output in input order while requests are still being processed."""
+    results = in_order(completions)
+    output.writeJsons(results)
+
+    # Without an output path nothing is consumed, still wait for all requests to complete
+    for _ in results:
+        pass
+
+
 def main(step: StepArgs):
     # Prepare headers - start with custom headers if provided
     headers = {}
@@ -220,71 +1211,124 @@ def main(step: StepArgs):
     if step.config.useGoogleToken:
         print("Getting credentials from Application Default Credentials (ADC)")
         scopes = step.config.scopes if step.config.scopes else []
-        token_manager = TokenManager(scopes)
-        headers['Authorization'] = f'Bearer {token_manager.get_token()}'
+        token_manager = TokenManager(scopes, cache_tokens=bool(step.config.tokenCache))
         print(f"Added Bearer token to request headers with auto-refresh capability")
 
     # Read input jsonl with request information
-    records = step.input.readJsons()
+    records = read_records(step.input.path)
     print(f"Processing {len(records)} requests...")
 
     # Get concurrency and rate limit settings
     concurrency = step.config.concurrency if step.config.concurrency else 1
     rate_limit = step.config.rateLimit if step.config.rateLimit else 0
+    rate_limit_burst = step.config.rateLimitBurst if step.config.rateLimitBurst else 1
 
     print(f"Using concurrency: {concurrency}")
     if rate_limit > 0:
-        print(f"Rate limit: {rate_limit} requests/minute")
+        print(f"Rate limit: {rate_limit} requests/minute (burst: {rate_limit_burst})")
     else:
         print("Rate limit: disabled")
 
     # Initialize rate limiter and progress tracker
-    rate_limiter = RateLimiter(rate_limit)
+    rate_limiter = AsyncRateLimiter(rate_limit, rate_limit_burst) if step.config.useAsync else RateLimiter(rate_limit, rate_limit_burst)
     progress_tracker = ProgressTracker(len(records))
 
     # Get timestamp format
     timestamp_format = step.config.timestampFormat
 
-    # Start progress reporter thread
-    stop_event = Event()
-    reporter_thread = Thread(target=progress_reporter, args=(progress_tracker, stop_event), daemon=True)
-    reporter_thread.start()
+    # Get timeout and response size settings
+    timeout = (step.config.connectTimeout, step.config.readTimeout)
+    body_max_bytes = step.config.bodyMaxBytes
+    raw_body = bool(step.config.rawBody)
+    capture_body = step.config.captureBody
+    print(f"Timeouts: connect {timeout[0]}s, read {timeout[1]}s")
 
-    results = []
+    # Get retry settings for transient errors (429 and 5xx)
+    max_retries = step.config.maxRetries if step.config.maxRetries else 0
+    if max_retries > 0:
+        print(f"Retries: up to {max_retries} with exponential backoff")
 
-    # Process requests with threading
-    with ThreadPoolExecutor(max_workers=concurrency) as executor:
-        # Submit all requests
-        future_to_idx = {
-            executor.submit(process_request, idx, record, headers, rate_limiter, progress_tracker, timestamp_format, token_manager): idx
-            for idx, record in enumerate(records)
-        }
+    # Get batch size (Google APIs accept up to 1000 requests per batch, many limit it to 100)
+    batch_size = step.config.batchSize
 
-        # Collect results as they complete
-        for future in as_completed(future_to_idx):
-            idx = future_to_idx[future]
-            try:
-                result = future.result()
-                if result:
-                    results.append((idx, result))
-            except Exception as e:
-                progress_tracker.increment(is_error=True)
-                print(f"Unexpected error processing request {idx + 1}: {e}", file=sys.stderr)
+    # Resolve hosts up front, so DNS lookups are done once per host
+    dns_cache = DnsCache()
+    print(f"Resolved {resolve_hosts(records, dns_cache, concurrency)} hosts")
+    dns_cache.install()
+
+    # Optionally adapt concurrency to the server's capacity, with concurrency as the upper bound
+    concurrency_limiter = None
+    if step.config.adaptiveConcurrency:
+        print(f"Adaptive concurrency: starting at 1, up to {concurrency}")
+        concurrency_limiter = AsyncConcurrencyLimiter(concurrency) if step.config.useAsync else ConcurrencyLimiter(concurrency)
+
+    # Optionally issue identical requests only once
+    if step.config.dedup:
+        items, duplicates = deduplicate(records)
+        print(f"Deduplicated {len(records)} requests to {len(items)} unique requests")
+    else:
+        items, duplicates = list(enumerate(records)), {}
+
+    # Start background logging thread
+    log_listener = start_logging()
+
+    if step.config.useAsync:
+        # Process requests on a single event loop in a background thread, streaming results back through a queue
+        print("Using asyncio event loop")
+        if step.config.useHttp2:
+            print("Using HTTP/2")
+        completed = Queue()
+        loop_errors = []
+        loop_thread = Thread(target=run_loop, args=(process_requests_async(
+            items, headers, concurrency, rate_limiter, progress_tracker, timestamp_format, token_manager, timeout,
+            body_max_bytes, max_retries, bool(step.config.useHttp2), completed, concurrency_limiter, raw_body,
+            capture_body), loop_errors))
+        loop_thread.start()
+        try:
+            completions = scatter_duplicates(iter(completed.get, None), duplicates, progress_tracker)
+            write_results(step.output, report_progress(completions, progress_tracker))
+        finally:
+            loop_thread.join()
+            # Exceptions don't propagate out of threads, re-raise e.g. the SystemExit of a failed token refresh
+            if loop_errors:
+                raise loop_errors[0]
+    else:
+        # Optionally group Google API requests into multipart batch requests
+        if step.config.batch:
+            batches, single = group_batches(items, batch_size)
+            print(f"Batching {len(items) - len(single)} requests into {len(batches)} batch requests")
+        else:
+            batches, single = [], items
 
-    # Stop progress reporter
-    stop_event.set()
-    reporter_thread.join()
+        # Process requests with threading, sharing one connection pool across workers
+        with create_session(headers, concurrency, max_retries) as session, ThreadPoolExecutor(max_workers=concurrency) as executor:
+            # Submit requests from a background thread, keeping only a few ahead of the workers
+            task = partial(process_limited, concurrency_limiter) if concurrency_limiter else process_request
+            # Submit each batch at the position of its first request, so results can be written in order
+            # without holding back the single requests that follow it
+            jobs = (job for _, job in merge(
+                ((idx, (idx, task, idx, record, session, rate_limiter, progress_tracker, timestamp_format,
+                        token_manager, timeout, body_max_bytes, max_retries, raw_body, capture_body))
+                 for idx, record in single),
+                ((batch_items[0][0], (batch_items, process_batch, batch_url, batch_items, session, rate_limiter,
+                                      progress_tracker, timestamp_format, token_manager, timeout, body_max_bytes,
+                                      max_retries, raw_body, capture_body))
+                 for batch_url, batch_items in batches),
+            ))
+            completed = Queue()
+            submit_thread = Thread(target=submit_bounded, args=(executor, jobs, completed, concurrency * 2))
+            submit_thread.start()
 
-    # Sort results by original index to maintain order
-    results.sort(key=lambda x: x[0])
-    results = [r[1] for r in results]
+            # Write results as they complete
+            completions = iter_completed(iter(completed.get, None), progress_tracker)
+            completions = scatter_duplicates(completions, duplicates, progress_tracker)
+            write_results(step.output, report_progress(completions, progress_tracker))
+            submit_thread.join()
 
-    # Remove success flag before writing (internal use only)
-    for result in results:
-        result.pop('success', None)
+    dns_cache.uninstall()
 
-    # Write output
-    step.output.writeJsons(results)
+    # Flush pending log records
+    log_listener.stop()
 
     # Print final statistics
     final_stats = progress_tracker.get_stats()
@@ -307,6 +1351,21 @@ def validate_config(config):
             print("Cannot use `useGoogleToken` when custom `Authorization` header is provided in `headers`", file=sys.stderr)
             return False
 
+    # Check that tokenCache is only used when useGoogleToken is true
+    if config.tokenCache and not config.useGoogleToken:
+        print("Parameter `tokenCache` can only be used when `useGoogleToken` is true", file=sys.stderr)
+        return False
+
+    # Check that batching is only requested for the threaded path
+    if config.batch and config.useAsync:
+        print("Parameter `batch` cannot be used when `useAsync` is true", file=sys.stderr)
+        return False
+
+    # Check that HTTP/2 is only requested for the asyncio path
+    if config.useHttp2 and not config.useAsync:
+        print("Parameter `useHttp2` can only be used when `useAsync` is true", file=sys.stderr)
+        return False
+
     return True
 
 
@@ -316,10 +1375,24 @@ if __name__ == "__main__":
          .output(optional=True)
          .config("useGoogleToken", optional=True)
          .config("scopes", optional=True)
+         .config("tokenCache", optional=True)
          .config("headers", optional=True)
          .config("concurrency", optional=True)
+         .config("adaptiveConcurrency", optional=True)
          .config("rateLimit", optional=True)
+         .config("rateLimitBurst", optional=True)
          .config("timestampFormat", optional=True, default_value="%Y-%m-%d %H:%M:%S")
+         .config("connectTimeout", optional=True, default_value=5)
+         .config("readTimeout", optional=True, default_value=30)
+         .config("bodyMaxBytes", optional=True, default_value=10 * 1024 * 1024)
+         .config("rawBody", optional=True)
+         .config("captureBody", optional=True, default_value=True)
+         .config("useAsync", optional=True)
+         .config("useHttp2", optional=True)
+         .config("maxRetries", optional=True)
+         .config("dedup", optional=True)
+         .config("batch", optional=True)
+         .config("batchSize", optional=True, default_value=100)
          .validate(validate_config)
          .build()
          )